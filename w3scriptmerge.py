@@ -29,13 +29,18 @@
 
 import io
 import os
+import re
 import sys
+import mmap
+import codecs
+import hashlib
 import shlex
 import shutil
 import struct
 import argparse
 import tempfile
 import subprocess
+import concurrent.futures
 
 # NOTES:
 #
@@ -45,12 +50,39 @@ import subprocess
 #    conversions and does all its work in there, and then re-converts to
 #    UTF-16 once done.
 #  - Not all mod scripts are UTF-16 encoded (also alas).  At the moment, we
-#    look for a UTF-16 BOM and assume the file is latin1/ISO-8859 if that's
-#    not found.  This logic will obviously fail if we come across a mod
-#    file that's UTF-8 or something.  If I run into that, I may have to pull
-#    in chardet: https://github.com/chardet/chardet
+#    look for a UTF-16 or UTF-8 BOM, and if that's not found, check whether
+#    the file is valid UTF-8, assuming latin1/ISO-8859 if not.  This logic
+#    will obviously fail if we come across a mod file in some other encoding.
+#    If I run into that, I may have to pull in chardet:
+#    https://github.com/chardet/chardet
 #
 
+# How much data to transcode at a time, when converting script files to and
+# from our cached UTF-8 copies
+CHUNK_SIZE = 1024*1024
+
+# Buffer size to use when opening script files, so that most scripts get
+# read or written in just a syscall or two
+BUFFER_SIZE = 1024*1024
+
+# Encodings to use for script files starting with the given BOMs, along with
+# the length of the BOM itself
+BOM_ENCODINGS = {
+        b"\xFF\xFE": ('utf-16-le', 2),
+        b"\xFE\xFF": ('utf-16-be', 2),
+        b"\xEF\xBB\xBF": ('utf-8', 3),
+        }
+
+# Version of the files we store in our persistent cache.  Bump this if the
+# conversion ever changes, so that stale files get ignored.
+CACHE_VERSION = 2
+
+# Digest size to use for the blake2b hashes of our converted script contents
+HASH_DIGEST_SIZE = 16
+
+# Characters we refuse to allow in --diff-command
+SHELL_METACHARACTERS_RE = re.compile(r'[|&<>()\[\]{}$!*#"\';`\n]')
+
 class InvalidBundleException(Exception):
     pass
 
@@ -83,15 +115,148 @@ def get_filenames_from_bundle(filename):
             df.seek(64, io.SEEK_CUR)
     return filenames
 
+def get_default_cache_dir():
+    """
+    Returns the directory we'll use to keep converted stock scripts around
+    between runs, following the XDG base directory spec.
+    """
+    if 'XDG_CACHE_HOME' in os.environ and os.environ['XDG_CACHE_HOME']:
+        cache_base = os.environ['XDG_CACHE_HOME']
+    else:
+        cache_base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_base, 'w3scriptmerge')
+
+def walk_files(top):
+    """
+    Yields the paths of all files found underneath the directory `top`.  Uses
+    `os.scandir` directly, which lets us get file types from the directory
+    listing itself without `stat`ing every entry.  As with `os.walk`,
+    symlinked directories are not followed, and directories which can't be
+    read are silently skipped.
+    """
+    dirs = [top]
+    while dirs:
+        try:
+            it = os.scandir(dirs.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path
+
+def shell_command(command):
+    """
+    argparse type which splits `command` into a list of arguments, refusing
+    anything which looks like it's trying to do more than run a single
+    command.
+    """
+    if SHELL_METACHARACTERS_RE.search(command):
+        raise argparse.ArgumentTypeError('Fancy shell shenanigans are not allowed')
+    try:
+        return shlex.split(command)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def run_concurrently(func, items):
+    """
+    Calls `func` on each of `items` using a pool of worker threads, and waits
+    for them all to finish.  Any exception raised by `func` is re-raised here.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for _ in executor.map(func, items):
+            pass
+
+def link_or_copy(src, dst):
+    """
+    Hardlinks `dst` to `src` if possible, falling back to a plain copy (for
+    instance if the two are on different filesystems).
+    """
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def hash_file(filename):
+    """
+    Returns a blake2b hash of the contents of the file `filename`.
+    """
+    content_hash = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+    with open(filename, 'rb', buffering=BUFFER_SIZE) as df:
+        while chunk := df.read(CHUNK_SIZE):
+            content_hash.update(chunk)
+    return content_hash.digest()
+
+def files_match(path1, path2):
+    """
+    Returns `True` if the files at `path1` and `path2` (which are assumed to be
+    the same size) have identical contents.
+    """
+    with open(path1, 'rb', buffering=0) as df1:
+        with open(path2, 'rb', buffering=0) as df2:
+            while chunk := df1.read(CHUNK_SIZE):
+                if chunk != df2.read(CHUNK_SIZE):
+                    return False
+    return True
+
+def file_contains(filename, needle):
+    """
+    Returns `True` if the bytes `needle` are found anywhere in the file
+    `filename`.  The file is memory-mapped and searched in place, so it never
+    has to be read in as a whole.
+    """
+    with open(filename, 'rb') as df:
+        # Empty files can't be mapped (and can't contain anything anyway)
+        if os.fstat(df.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(df.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.find(needle) != -1
+
+def transcode(df, odf, from_encoding, to_encoding='utf-8', newline='\n', content_hash=None):
+    """
+    Streams the contents of the binary file object `df`, encoded as
+    `from_encoding`, into the binary file object `odf` as `to_encoding`,
+    converting any line endings to `newline` along the way.  If
+    `content_hash` is not None, it will be updated with the data written.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(from_encoding)(), translate=True)
+    encoder = codecs.getincrementalencoder(to_encoding)()
+    final = False
+    while not final:
+        chunk = df.read(CHUNK_SIZE)
+        final = not chunk
+        text = decoder.decode(chunk, final=final)
+        if newline != '\n':
+            text = text.replace('\n', newline)
+        data = encoder.encode(text, final=final)
+        odf.write(data)
+        if content_hash is not None:
+            content_hash.update(data)
+
 class ScriptFile:
     """
     A single Witcher 3 script filen instance, whether it be a stock game file,
     modded version, or our final merged version.  This class keeps track of both
     the original/eventual on-disk location and the tmpdir-cache that we actually
-    use while processing.
+    use while processing.  If `cache_dir` is not None, our conversion will be
+    kept in there across runs, and `path_persistent` will point at it.  The
+    `hash` attribute holds a hash of the cached file as it was initially
+    converted.  If `content_cache` is not None, it should be a dict shared
+    between ScriptFiles (mapping original file sizes to lists of ScriptFiles),
+    which is used to avoid converting the same original contents more than once.
+    The directory for our tmpdir-cache location is expected to exist already
+    (ScriptRegistry creates those in bulk while adding mods).
     """
 
-    def __init__(self, filename, mod, tmpdir, path_orig, force_cache=True, create_dummy_if_missing=False):
+    # We create one of these for every version of every script, so skip the
+    # per-instance __dict__
+    __slots__ = ('tmpdir', 'filename', 'mod', 'path_orig', 'dir_orig',
+            'path_cached', 'dir_cached', 'path_persistent', '_hash')
+
+    def __init__(self, filename, mod, tmpdir, path_orig, force_cache=True, create_dummy_if_missing=False,
+            cache_dir=None, content_cache=None):
         self.tmpdir = tmpdir
         self.filename = filename
         self.mod = mod
@@ -99,34 +264,140 @@ class ScriptFile:
         self.dir_orig = os.path.dirname(path_orig)
         self.path_cached = os.path.join(tmpdir, mod, filename)
         self.dir_cached = os.path.dirname(self.path_cached)
+        self.path_persistent = None
+        self._hash = None
         #print('Paths:')
         #print(f'  - Orig: {self.path_orig}')
         #print(f'  - Cache: {self.path_cached}')
-        if not os.path.exists(self.dir_cached):
-            os.makedirs(self.dir_cached, exist_ok=True)
         if os.path.exists(self.path_orig):
-            # "new" files added to the game via mods, such as `noTimeForGwent.ws`,
-            # might not actually be UTF-16 (it looks like other mods might even
-            # "overwrite" previously-UTF-16 files with non-UTF-16).  We'll check
-            # for a BOM and assume anything without a BOM is latin1/ISO-8859.
-            # Hopefully we don't run into something which starts encoding in UTF-8.
-            with open(self.path_orig, 'rb') as df:
-                bom = df.read(3)
-                if bom[:2] == b"\xFF\xFE" or bom[:2] == b"\xFE\xFF":
-                    encoding='utf-16'
-                elif bom == b"\xEF\xBB\xBF":
-                    encoding='utf-8-sig'
-                else:
-                    encoding='latin1'
-            with open(self.path_orig, 'rt', encoding=encoding) as df:
-                with open(self.path_cached, 'wt', encoding='utf-8') as odf:
-                    odf.write(df.read())
+            # Lots of mods ship unaltered copies of the same files, so if we've
+            # already converted a file with identical contents during this
+            # run, just reuse that conversion.  Stock files are checked against
+            # the persistent cache instead, since they're unique per script.
+            stat = os.stat(self.path_orig)
+            other = None
+            if content_cache is not None and cache_dir is None:
+                other = self.find_duplicate(content_cache, stat.st_size)
+            if other is not None:
+                link_or_copy(other.path_cached, self.path_cached)
+                self._hash = other.hash
+            elif cache_dir is None:
+                self._hash = self.convert_orig(self.path_cached)
+            else:
+                self._hash = self.convert_cached(cache_dir, stat)
+            if content_cache is not None and other is None:
+                content_cache.setdefault(stat.st_size, []).append(self)
         elif create_dummy_if_missing:
-            with open(self.path_cached, 'wt', encoding='utf-8') as odf:
+            with open(self.path_cached, 'wb') as odf:
                 pass
         elif force_cache:
             raise RuntimeError('Original script not found: {}'.format(self.path_orig))
 
+    def convert_cached(self, cache_dir, stat):
+        """
+        Converts our original file by way of the persistent cache in
+        `cache_dir`, keyed on the original's path, size, and mtime (taken from
+        `stat`), so we only ever have to convert a given version of a file
+        once.  Falls back to a direct conversion if the cache can't be used.
+        Returns a hash of the converted contents, or None if we didn't have to
+        convert anything.
+        """
+        path_hash = hashlib.sha1(os.path.realpath(self.path_orig).encode('utf-8')).hexdigest()
+        self.path_persistent = os.path.join(cache_dir, '{}-{}-{}-v{}.utf8'.format(
+            path_hash,
+            stat.st_size,
+            stat.st_mtime_ns,
+            CACHE_VERSION,
+            ))
+        content_hash = None
+        try:
+            if not os.path.exists(self.path_persistent):
+                # Write to a temp name first so that an interrupted run
+                # can't leave a partial conversion behind
+                path_temp = f'{self.path_persistent}.{os.getpid()}.tmp'
+                try:
+                    content_hash = self.convert_orig(path_temp)
+                    os.replace(path_temp, self.path_persistent)
+                finally:
+                    # This'll only still be around if the conversion got
+                    # interrupted or failed
+                    if os.path.exists(path_temp):
+                        os.unlink(path_temp)
+            link_or_copy(self.path_persistent, self.path_cached)
+        except OSError:
+            # If the cache can't be used for whatever reason, fall back to
+            # converting straight into our tmpdir
+            self.path_persistent = None
+            content_hash = self.convert_orig(self.path_cached)
+        return content_hash
+
+    def find_duplicate(self, content_cache, size):
+        """
+        Looks through `content_cache` for an already-converted ScriptFile whose
+        original has the same contents as ours (which is `size` bytes long).
+        Only files of the same size ever have to be compared, and those are
+        compared directly, which is much cheaper than hashing them both.
+        Returns None if no match is found.
+        """
+        if size in content_cache:
+            for other in content_cache[size]:
+                if files_match(self.path_orig, other.path_orig):
+                    return other
+        return None
+
+    def convert_orig(self, path_dest):
+        """
+        Converts our original file to UTF-8 (with unix line endings), writing
+        the result to `path_dest`.  Returns a hash of the converted contents.
+        """
+        # "new" files added to the game via mods, such as `noTimeForGwent.ws`,
+        # might not actually be UTF-16 (it looks like other mods might even
+        # "overwrite" previously-UTF-16 files with non-UTF-16).  We'll check
+        # for a BOM, and for anything without a BOM, check whether it's valid
+        # UTF-8 and assume it's latin1/ISO-8859 if not.  Non-ASCII latin1 text
+        # is very unlikely to also happen to be valid UTF-8.
+        content_hash = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+        with open(self.path_orig, 'rb', buffering=BUFFER_SIZE) as df:
+            bom = df.read(3)
+            encoding, bom_len = BOM_ENCODINGS.get(bom) or BOM_ENCODINGS.get(bom[:2], (None, 0))
+            df.seek(bom_len)
+            if encoding is None:
+                # If the file turns out to be UTF-8 with unix line endings,
+                # it's already exactly what we'd write out, so we can skip
+                # transcoding it entirely.
+                utf8_check = codecs.getincrementaldecoder('utf-8')()
+                has_cr = False
+                try:
+                    while chunk := df.read(CHUNK_SIZE):
+                        utf8_check.decode(chunk)
+                        if b'\r' in chunk:
+                            has_cr = True
+                        content_hash.update(chunk)
+                    utf8_check.decode(b'', final=True)
+                    if has_cr:
+                        encoding='utf-8'
+                except UnicodeDecodeError:
+                    encoding='latin1'
+                if encoding is not None:
+                    df.seek(0)
+                    content_hash = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+            if encoding is not None:
+                with open(path_dest, 'wb', buffering=BUFFER_SIZE) as odf:
+                    transcode(df, odf, encoding, content_hash=content_hash)
+        if encoding is None:
+            link_or_copy(self.path_orig, path_dest)
+        return content_hash.digest()
+
+    @property
+    def hash(self):
+        """
+        Hash of our cached file's contents, as initially converted.  This is
+        only computed on-demand if we didn't get it during the conversion.
+        """
+        if self._hash is None:
+            self._hash = hash_file(self.path_cached)
+        return self._hash
+
     def copy_to_orig(self):
         """
         Copies the file in our cached location to the original in-game location
@@ -135,9 +406,14 @@ class ScriptFile:
         """
         if not os.path.exists(self.dir_orig):
             os.makedirs(self.dir_orig, exist_ok=True)
-        with open(self.path_cached, 'rt', encoding='utf-8') as df:
-            with open(self.path_orig, 'wt', encoding='utf-16', newline="\r\n") as odf:
-                odf.write(df.read())
+        # Our cached copy may just be a hardlink to the original; if so, get
+        # it out of the way so we don't truncate the data we're about to read
+        if os.path.exists(self.path_orig) and os.path.samefile(self.path_cached, self.path_orig):
+            os.unlink(self.path_orig)
+        with open(self.path_cached, 'rb', buffering=BUFFER_SIZE) as df:
+            with open(self.path_orig, 'wb', buffering=BUFFER_SIZE) as odf:
+                odf.write(codecs.BOM_UTF16_LE)
+                transcode(df, odf, 'utf-8', 'utf-16-le', newline="\r\n")
 
 class ModScript:
     """
@@ -153,12 +429,17 @@ class ModScript:
     stock_key = '_basegame_'
     merged_key = 'mod0000_apoc_merged'
 
-    def __init__(self, witcher3_dir, filename, tmpdir):
+    __slots__ = ('tmpdir', 'filename', 'content_cache', 'stock', 'merged', 'mods', 'merge_problems')
+
+    def __init__(self, witcher3_dir, filename, tmpdir, cache_dir=None, content_cache=None):
         self.tmpdir = tmpdir
         self.filename = filename
+        self.content_cache = content_cache
         self.stock = ScriptFile(filename, self.stock_key, self.tmpdir,
                 os.path.join(witcher3_dir, 'content', 'content0', filename),
-                create_dummy_if_missing=True)
+                create_dummy_if_missing=True,
+                cache_dir=cache_dir,
+                content_cache=content_cache)
         self.merged = ScriptFile(filename, self.merged_key, self.tmpdir,
                 os.path.join(self.merged_key, 'content', filename),
                 force_cache=False)
@@ -177,7 +458,8 @@ class ModScript:
                 mod,
                 ))
         self.mods[mod] = ScriptFile(self.filename, mod, self.tmpdir,
-                os.path.join(mod, 'content', self.filename))
+                os.path.join(mod, 'content', self.filename),
+                content_cache=self.content_cache)
 
     def show_diffs(self, mod, diff_command):
         """
@@ -199,6 +481,13 @@ class ModScript:
         else:
             raise RuntimeError('Could not figure out "to" path for diffs')
 
+    def changed_mod_files(self):
+        """
+        Returns a list of the mod versions of this script which actually
+        differ from the stock version.
+        """
+        return [mod_file for mod_file in self.mods.values() if mod_file.hash != self.stock.hash]
+
     def merge(self, editor=None):
         """
         Merge all mods into our single merged file (even if there's only
@@ -207,26 +496,56 @@ class ModScript:
         only writes out to our tmpdir/cached location -- use `copy_merged_to_live`
         to copy the final file to its ultimate location.
         """
-        mod_files = list(self.mods.values())
+        self.merge_problems = False
+
+        # Mods which ship unaltered copies of the stock script don't contribute
+        # anything to the merge, so leave those out entirely.
+        mod_files = self.changed_mod_files()
 
-        # Just copy the first one
-        with open(mod_files[0].path_cached, 'rt', encoding='utf-8') as df:
-            with open(self.merged.path_cached, 'wt', encoding='utf-8') as odf:
-                odf.write(df.read())
+        # Our cached merge file might be a hardlink to a previous merge's
+        # output, so unlink it rather than writing through to that.
+        if os.path.exists(self.merged.path_cached):
+            os.unlink(self.merged.path_cached)
+
+        # If nothing's actually been changed, we just end up with the stock file
+        if not mod_files:
+            link_or_copy(self.stock.path_cached, self.merged.path_cached)
+            return
+
+        # Just copy the first one.  (This is a real copy rather than a link,
+        # since some editors write in-place to files with multiple links.)
+        shutil.copyfile(mod_files[0].path_cached, self.merged.path_cached)
+        merged_hash = mod_files[0].hash
 
         # And now loop through the rest
         for mod_file in mod_files[1:]:
-            cp = subprocess.run(['diff3', '-m',
-                self.merged.path_cached,
-                self.stock.path_cached,
-                mod_file.path_cached,
-                ], capture_output=True, encoding='utf-8')
-            with open(self.merged.path_cached, 'wt', encoding='utf-8') as odf:
-                odf.write(cp.stdout)
-            file_data = cp.stdout
-            # Was originally checking for `<<<<<<<`, and was planning on expanding that,
-            # but I think mentions of our tmp directory will be a far better check
-            while self.tmpdir in file_data:
+            # If this mod's version matches what we've merged so far, there's
+            # nothing new to merge in, so don't bother spawning diff3 for it.
+            if mod_file.hash == merged_hash:
+                continue
+            merged_hash = None
+            # diff3 reads from our merged file while it runs, so send its
+            # output to a temp file alongside it, and swap that into place
+            # once it's done.
+            fd, path_temp = tempfile.mkstemp(dir=self.merged.dir_cached, prefix='.merge-')
+            with os.fdopen(fd, 'wb') as odf:
+                cp = subprocess.run(['diff3', '-m',
+                    self.merged.path_cached,
+                    self.stock.path_cached,
+                    mod_file.path_cached,
+                    ], stdout=odf, stderr=subprocess.PIPE, encoding='utf-8')
+            # diff3 exits with 0 for a clean merge, 1 if there were conflicts,
+            # and 2 if something went wrong
+            if cp.returncode > 1:
+                os.unlink(path_temp)
+                raise RuntimeError('diff3 failed while merging {} into {}: {}'.format(
+                    mod_file.mod,
+                    self.filename,
+                    cp.stderr.strip(),
+                    ))
+            os.replace(path_temp, self.merged.path_cached)
+            conflicts = (cp.returncode == 1)
+            while conflicts:
                 if editor is None:
                     break
                 else:
@@ -234,11 +553,12 @@ class ModScript:
                     resp = resp.strip()
                     if resp == '' or resp[0].lower() == 'y':
                         subprocess.run([editor, self.merged.path_cached])
-                        with open(self.merged.path_cached, 'rt', encoding='utf-8') as df:
-                            file_data = df.read()
+                        # Was originally checking for `<<<<<<<`, and was planning on expanding that,
+                        # but I think mentions of our tmp directory will be a far better check
+                        conflicts = file_contains(self.merged.path_cached, self.tmpdir.encode('utf-8'))
                     else:
                         break
-            if self.tmpdir in file_data:
+            if conflicts:
                 self.merge_problems = True
 
     def copy_merged_to_live(self):
@@ -254,14 +574,19 @@ class ScriptRegistry:
     Registry of all scripts found in all mods.  Intended to be used as
     a context manager using the `with `statement.  Also attempts to keep track
     of files in `blob0.bundle` files, so that we can report if there are
-    conflicts between those (though those fixes would have to be manual)
+    conflicts between those (though those fixes would have to be manual).
+    If `cache_dir` is not None, converted stock scripts will be kept in there
+    across runs.
     """
 
-    def __init__(self, witcher3_dir):
+    def __init__(self, witcher3_dir, cache_dir=None):
         self.witcher3_dir = witcher3_dir
+        self.cache_dir = cache_dir
         self._tmpdir = None
         self.tmpdirname = None
         self.scripts = {}
+        self._sorted_scripts = None
+        self._content_cache = {}
         self.bundled_files = {}
         self.bundled_files_by_mod = {}
         self.mods = set()
@@ -269,14 +594,51 @@ class ScriptRegistry:
     def __enter__(self):
         self._tmpdir = tempfile.TemporaryDirectory()
         self.tmpdirname = self._tmpdir.name
+        self._content_cache = {}
         #print('Created tmpdir: {}'.format(self.tmpdirname))
+        if self.cache_dir is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                if not os.access(self.cache_dir, os.W_OK):
+                    print(f'NOTICE: Cache dir {self.cache_dir} is not writable, not caching')
+                    self.cache_dir = None
+            except OSError as e:
+                print(f'NOTICE: Unable to create cache dir {self.cache_dir}, not caching: {e}')
+                self.cache_dir = None
         return self
 
     def __exit__(self, exit_type, value, traceback):
+        if exit_type is None and self.cache_dir is not None:
+            self.prune_cache()
         self._tmpdir.cleanup()
         self._tmpdir = None
         self.tmpdirname = None
 
+    def prune_cache(self):
+        """
+        Removes entries from our persistent cache which are for older versions
+        of the stock scripts we used during this run, so that the cache doesn't
+        just keep growing each time the game gets patched.  Also cleans up any
+        temp files for those scripts left behind by runs which died partway
+        through converting.
+        """
+        current = set()
+        for script in self.scripts.values():
+            if script.stock.path_persistent is not None:
+                current.add(os.path.basename(script.stock.path_persistent))
+        path_hashes = {name.split('-', 1)[0] for name in current}
+        if not path_hashes:
+            return
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if (entry.name.endswith('.utf8') or entry.name.endswith('.tmp')) \
+                        and entry.name not in current \
+                        and entry.name.split('-', 1)[0] in path_hashes:
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+
     def add_mod_dir(self, mod, allow_merged=False):
         """
         Adds the specified `mod` directory to the registry, creating ModScript
@@ -299,30 +661,56 @@ class ScriptRegistry:
             return
         content_prefix = f'{mod}/content/'
         content_prefix_len = len(content_prefix)
-        for dirpath, _, filenames in os.walk(mod):
-            for filename in filenames:
-                if filename.endswith('.ws'):
-                    filename_script = os.path.join(dirpath, filename)
-                    if not filename_script.startswith(content_prefix):
-                        raise RuntimeError(f'Does not start with expected prefix: {filename_script}')
-                    filename_script = filename_script[content_prefix_len:]
-                    if filename_script not in self.scripts:
-                        self.scripts[filename_script] = ModScript(self.witcher3_dir, filename_script, self.tmpdirname)
-                    if mod != ModScript.merged_key:
-                        self.scripts[filename_script].import_from_mod(mod)
-                elif filename.endswith('.bundle'):
-                    filename_bundle = os.path.join(dirpath, filename)
-                    try:
-                        self.bundled_files_by_mod[mod] = get_filenames_from_bundle(filename_bundle)
-                        for filename in self.bundled_files_by_mod[mod]:
-                            if filename in self.bundled_files:
-                                self.bundled_files[filename].add(mod)
-                            else:
-                                self.bundled_files[filename] = {mod}
-                    except InvalidBundleException as e:
-                        print(f'Unable to parse bundle file: {filename_bundle}')
+        filenames_script = []
+        for filename in walk_files(mod):
+            if filename.endswith('.ws'):
+                if not filename.startswith(content_prefix):
+                    raise RuntimeError(f'Does not start with expected prefix: {filename}')
+                filenames_script.append(filename[content_prefix_len:])
+            elif filename.endswith('.bundle'):
+                filename_bundle = filename
+                try:
+                    self.bundled_files_by_mod[mod] = get_filenames_from_bundle(filename_bundle)
+                    for filename in self.bundled_files_by_mod[mod]:
+                        if filename in self.bundled_files:
+                            self.bundled_files[filename].add(mod)
+                        else:
+                            self.bundled_files[filename] = {mod}
+                except InvalidBundleException as e:
+                    print(f'Unable to parse bundle file: {filename_bundle}')
+
+        # Create all the cache dirs we'll need up front, rather than checking
+        # for them file-by-file.  Sorting means parents get created first.
+        cache_dirs = set()
+        for filename_script in filenames_script:
+            if filename_script not in self.scripts:
+                cache_dirs.add(os.path.dirname(os.path.join(self.tmpdirname, ModScript.stock_key, filename_script)))
+                cache_dirs.add(os.path.dirname(os.path.join(self.tmpdirname, ModScript.merged_key, filename_script)))
+            if mod != ModScript.merged_key:
+                cache_dirs.add(os.path.dirname(os.path.join(self.tmpdirname, mod, filename_script)))
+        for dirname in sorted(cache_dirs):
+            os.makedirs(dirname, exist_ok=True)
+
+        for filename_script in filenames_script:
+            if filename_script not in self.scripts:
+                self.scripts[filename_script] = ModScript(self.witcher3_dir, filename_script, self.tmpdirname,
+                        cache_dir=self.cache_dir,
+                        content_cache=self._content_cache)
+                self._sorted_scripts = None
+            if mod != ModScript.merged_key:
+                self.scripts[filename_script].import_from_mod(mod)
         self.mods.add(mod)
 
+    def sorted_scripts(self):
+        """
+        Returns a list of `(filename, script)` tuples for all our scripts,
+        sorted by filename.  The sorted list is kept around until another
+        script is added.
+        """
+        if self._sorted_scripts is None:
+            self._sorted_scripts = sorted(self.scripts.items())
+        return self._sorted_scripts
+
     def show_diffs(self, mod, diff_command):
         """
         Show all diff from the stock/basegame scripts to the versions in the
@@ -336,7 +724,7 @@ class ScriptRegistry:
             for filename in sorted(self.bundled_files_by_mod[mod]):
                 print(f'Bundled file: {filename}')
         sys.stdout.flush()
-        for filename, script in sorted(self.scripts.items()):
+        for filename, script in self.sorted_scripts():
             script.show_diffs(mod, diff_command)
 
     def merge(self, editor=None):
@@ -346,11 +734,25 @@ class ScriptRegistry:
         mod dir to the final location.
         """
 
-        # First do all the merges
+        # First do all the merges.  Each merge is independent of the others
+        # and mostly just waits on diff3, so run them concurrently without
+        # prompting, and then go back over any conflicted scripts one at a
+        # time so the user can fix them interactively.  Scripts which only
+        # one mod actually changed just need a file copy, so those get done
+        # directly rather than being handed to the pool.
         print('Merging mods...')
+        to_diff3 = []
+        for filename, script in self.sorted_scripts():
+            if len(script.changed_mod_files()) > 1:
+                to_diff3.append(script)
+            else:
+                script.merge()
+        if to_diff3:
+            run_concurrently(ModScript.merge, to_diff3)
         problematic = []
-        for script in self.scripts.values():
-            script.merge(editor)
+        for filename, script in self.sorted_scripts():
+            if script.merge_problems and editor is not None:
+                script.merge(editor)
             if script.merge_problems:
                 problematic.append(script.merged.path_orig)
         if len(self.mods) == 1:
@@ -391,10 +793,11 @@ class ScriptRegistry:
                 raise RuntimeError(f'{ModScript.merged_key} is not a directory')
             shutil.rmtree(ModScript.merged_key)
 
-        # ... and copy our cached area over to "live"
+        # ... and copy our cached area over to "live".  Each copy is
+        # independent, so spread them over worker threads as well, letting
+        # the file reads and writes overlap.
         print(f'Copying to {ModScript.merged_key}...')
-        for script in self.scripts.values():
-            script.copy_merged_to_live()
+        run_concurrently(ModScript.copy_merged_to_live, [script for _, script in self.sorted_scripts()])
 
         # Report on finish
         print('Done!')
@@ -445,11 +848,16 @@ def main():
             )
 
     parser.add_argument('--diff-command',
-            type=str,
+            type=shell_command,
             default='diff -u --color=always',
             help="Command to use while showing diffs via the -d/--diff option",
             )
 
+    parser.add_argument('--no-cache',
+            action='store_true',
+            help="Don't keep converted stock scripts in ~/.cache/w3scriptmerge (or $XDG_CACHE_HOME/w3scriptmerge) between runs",
+            )
+
     # Parse args
     args = parser.parse_args()
 
@@ -458,28 +866,6 @@ def main():
         if args.diff.endswith(os.sep):
             args.diff = args.diff[:-1]
 
-    # Prevent anything weird in --diff-command, if we've been given it
-    diff_cmd = []
-    if '|' in args.diff_command \
-            or '&' in args.diff_command \
-            or '<' in args.diff_command \
-            or '>' in args.diff_command \
-            or '(' in args.diff_command \
-            or ')' in args.diff_command \
-            or '[' in args.diff_command \
-            or ']' in args.diff_command \
-            or '{' in args.diff_command \
-            or '}' in args.diff_command \
-            or '$' in args.diff_command \
-            or '!' in args.diff_command \
-            or '*' in args.diff_command \
-            or '#' in args.diff_command \
-            or '"' in args.diff_command \
-            or "'" in args.diff_command \
-            or ';' in args.diff_command:
-        parser.error("Fancy shell shenanigans are not allowed in --diff-command")
-    args.diff_command = shlex.split(args.diff_command)
-
     # Check to see if w3dir is actually a Witcher 3 dir -- if not, check to see
     # if we're running this inside the `mods` dir.
     if not os.path.exists(os.path.join(args.w3dir, 'bin', 'x64', 'witcher3.exe')):
@@ -490,7 +876,11 @@ def main():
             parser.error(f'ERROR: Could not find Witcher 3 install at {args.w3dir}')
 
     # Now actually do something
-    with ScriptRegistry(args.w3dir) as registry:
+    if args.no_cache:
+        cache_dir = None
+    else:
+        cache_dir = get_default_cache_dir()
+    with ScriptRegistry(args.w3dir, cache_dir=cache_dir) as registry:
         if args.diff:
             registry.add_mod_dir(args.diff, allow_merged=True)
             registry.show_diffs(args.diff, args.diff_command)